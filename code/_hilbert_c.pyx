@@ -0,0 +1,44 @@
+# cython: language_level=3
+# --------------------------------------------------------------------------------------------------
+# Hilbert Curve C Extension
+#
+# Point-at-a-time Hilbert curve coordinates computed in C, used by space_filling_curves.hilbert
+# when the extension has been built.
+# --------------------------------------------------------------------------------------------------
+# build: CFLAGS=-mbmi2 cythonize -i _hilbert_c.pyx
+#
+# Without -mbmi2 (or on CPUs without BMI2) the extension still builds, using shifts and masks
+# instead of the pext instruction.
+# --------------------------------------------------------------------------------------------------
+
+from libc.stdint cimport uint32_t, uint64_t
+
+cdef extern from "hilbert_bmi2.h":
+    void hilbert_d2xy(uint64_t i, int order, uint32_t *x, uint32_t *y) nogil
+
+
+cpdef tuple hilbert_c(uint64_t i, int order):
+    """
+    Compute the (x, y) coordinates of the i-th point on a Hilbert curve of a given order.
+
+    Parameters:
+    -----------
+    i : int
+        The index of the point on the Hilbert curve.
+    order : int
+        The order of the Hilbert curve, at most 31. The curve will cover a 2^order x 2^order
+        grid.
+
+    Returns:
+    --------
+    (x, y) : tuple of int
+        The (x, y) coordinates of the i-th point on the Hilbert curve.
+    """
+
+    cdef uint32_t x, y
+
+    if order < 0 or order > 31:
+        raise ValueError('invalid order, choose from (0, 1, ..., 31)')
+
+    hilbert_d2xy(i, order, &x, &y)
+    return (x, y)
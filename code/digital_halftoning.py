@@ -14,7 +14,7 @@
 # digital_halftoning.py -i data/impa.png -o data/impa_hilbert.png -t hilbert -s 8 -d ordered
 # --------------------------------------------------------------------------------------------------
 # usage: digital_halftoning.py [-h] [-i image_in] [-o image_out] [-t curve_type] [-s cluster_size]
-#                              [-d distribution] [-g gamma] [-b blur] [-w weight]
+#                              [-d distribution] [-g gamma] [-b blur] [-w weight] [-T tile]
 #
 # options:
 #   -h, --help                                    show this help message and exit
@@ -26,6 +26,7 @@
 #   -g gamma, --gamma gamma                       gamma value for gamma correction
 #   -b blur, --blur blur                          blur value for edge enhancement
 #   -w weight, --weight weight                    weight value for edge enhancement
+#   -T tile, --tile tile                          size of the tiles to halftone separately
 # --------------------------------------------------------------------------------------------------
 
 import argparse
@@ -33,6 +34,51 @@ import cv2
 import numpy as np
 from space_filling_curves import space_filling_curve
 
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+    prange = range
+    _HAS_NUMBA = False
+
+try:
+    import _halftone_aot
+except ImportError:
+    _halftone_aot = None
+
+
+def _ilog_ceil(n, base):
+    """
+    Compute the smallest order such that base^order >= n, using integer arithmetic only so
+    there are no rounding errors at exact powers of base.
+
+    Parameters:
+    -----------
+    n : int
+        The size to be covered.
+    base : int
+        The base of the powers to compare n against.
+
+    Returns:
+    --------
+    order : int
+        The computed order.
+    """
+
+    order = 0
+    power = 1
+
+    while power < n:
+        power *= base
+        order += 1
+
+    return order
+
 
 def order(image_in, curve_type):
     """
@@ -51,27 +97,32 @@ def order(image_in, curve_type):
         The computed order of the specified space-filling curve.
     """
 
+    size = max(image_in.shape)
+
     if curve_type == 'hilbert':
-        return np.ceil(np.log2(max(image_in.shape))).astype(int)
+        return (size - 1).bit_length()
     elif curve_type == 'peano':
-        return np.ceil(np.log(max(image_in.shape)) / np.log(3)).astype(int)
+        return _ilog_ceil(size, 3)
     elif curve_type == 'sierpinski':
-        return np.ceil(np.log(max(image_in.shape)) / np.log(4)).astype(int)
+        return _ilog_ceil(size, 4)
     else:
         raise ValueError('invalid curve type, choose from (hilbert, peano, sierpinski)')
 
 
-def gamma_correction(image_in, gamma):
+def gamma_correction(image_in, gamma, out=None):
     """
     Apply gamma correction to an input image.
 
     Parameters:
     -----------
     image_in : numpy.ndarray
-        The input image with pixel values in the range [0, 255].
+        The 8-bit input image with pixel values in the range [0, 255].
     gamma : float
         The gamma correction value. A gamma value < 1 will lighten the image, while a
         gamma value > 1 will darken the image.
+    out : numpy.ndarray, optional
+        The array to write the result to, which may be image_in itself. A new array is
+        allocated if not given.
 
     Returns:
     --------
@@ -79,13 +130,13 @@ def gamma_correction(image_in, gamma):
         The gamma-corrected image with pixel values in the range [0, 255].
     """
 
-    normalized_image = image_in / 255.0
-    gamma_corrected_image = np.power(normalized_image, gamma)
-    gamma_corrected_image = (gamma_corrected_image * 255).astype(np.uint8)
+    lut = np.power(np.arange(256) / 255.0, gamma)
+    lut = np.clip(lut * 255, 0, 255).astype(np.uint8)
+    gamma_corrected_image = cv2.LUT(image_in, lut, dst=out)
     return gamma_corrected_image
 
 
-def edge_enhancement(image_in, blur, weight):
+def edge_enhancement(image_in, blur, weight, out=None):
     """
     Enhance the edges of an input image using Gaussian blur and weighted addition.
 
@@ -97,6 +148,9 @@ def edge_enhancement(image_in, blur, weight):
         The standard deviation for Gaussian kernel used in blurring.
     weight : float
         The weight factor for combining the original and blurred images.
+    out : numpy.ndarray, optional
+        The array to write the result to, which must not be image_in. A new array is allocated
+        if not given.
 
     Returns:
     --------
@@ -104,13 +158,247 @@ def edge_enhancement(image_in, blur, weight):
         The edge-enhanced image.
     """
 
-    blurred_image = cv2.GaussianBlur(image_in, (0, 0), sigmaX=blur)
-    edge_enhanced_image = cv2.addWeighted(image_in, 1 + weight, blurred_image, -weight, 0)
-    edge_enhanced_image = np.clip(edge_enhanced_image, 0, 255).astype(np.uint8)
+    # the blurred image is computed in the output buffer and then overwritten in place, both
+    # operations saturate 8-bit results so no clipping is needed
+    edge_enhanced_image = np.empty_like(image_in) if out is None else out
+    cv2.GaussianBlur(image_in, (0, 0), sigmaX=blur, dst=edge_enhanced_image)
+    cv2.addWeighted(image_in, 1 + weight, edge_enhanced_image, -weight, 0, dst=edge_enhanced_image)
     return edge_enhanced_image
 
 
-def halftoning(image_in, curve_type, cluster_size, distribution):
+def _cluster_accumulators(image, curve, cluster_size):
+    """
+    Compute the intensity that each cluster of a space filling curve distributes over its
+    pixels.
+
+    This is the total intensity of the cluster plus the intensity carried over from the
+    previous clusters, which is the running sum of their intensities modulo 255. Knowing it
+    up front makes the clusters independent of each other.
+
+    Parameters:
+    -----------
+    image : numpy.ndarray
+        The flattened input grayscale image to be halftoned.
+    curve : numpy.ndarray
+        The index into the flattened image of each point on the space filling curve.
+    cluster_size : int
+        The size of the clusters to divide the curve into. The points left over at the end
+        of the curve form one last, smaller cluster.
+
+    Returns:
+    --------
+    accumulators : numpy.ndarray
+        The intensity to distribute in each cluster, followed by the one of the leftover
+        points (whose intensity is 0 if there are none).
+    """
+
+    n_clusters = len(curve) // cluster_size
+    usable = n_clusters * cluster_size
+
+    clusters = curve[:usable].reshape(n_clusters, cluster_size)
+
+    intensities = image[clusters].sum(axis=1, dtype=np.int64)
+    intensities = np.append(intensities, image[curve[usable:]].sum(dtype=np.int64))
+
+    carries = (np.cumsum(intensities) - intensities) % 255
+    return carries + intensities
+
+
+def _reorder_clusters(image, curve, cluster_size, distribution):
+    """
+    Reorder the points within each cluster of a space filling curve, in place.
+
+    Parameters:
+    -----------
+    image : numpy.ndarray
+        The flattened input grayscale image to be halftoned.
+    curve : numpy.ndarray
+        The index into the flattened image of each point on the space filling curve.
+    cluster_size : int
+        The size of the clusters to divide the curve into. The points left over at the end
+        of the curve form one last, smaller cluster.
+    distribution : str
+        The method of distributing pixel intensities within each cluster (ordered sorts the
+        points by intensity, random shuffles them).
+    """
+
+    n_clusters = len(curve) // cluster_size
+    usable = n_clusters * cluster_size
+
+    rng = np.random.default_rng()
+
+    for clusters in (curve[:usable].reshape(n_clusters, cluster_size), curve[np.newaxis, usable:]):
+        if distribution == 'ordered':
+            permutation = np.argsort(image[clusters], axis=1, kind='stable')
+        else:
+            identity = np.broadcast_to(np.arange(clusters.shape[1]), clusters.shape)
+            permutation = rng.permuted(identity, axis=1)
+
+        clusters[:] = np.take_along_axis(clusters, permutation, axis=1)
+
+
+def _halftone_prefix_sums(curve, cluster_size, accumulators, halftone):
+    """
+    Distribute the intensities of the clusters of a space filling curve over their pixels
+    without a per-pixel accumulator: a cluster that distributes an intensity acc turns on its
+    first acc // 255 pixels.
+
+    Parameters:
+    -----------
+    curve : numpy.ndarray
+        The index into the flattened image of each point on the space filling curve.
+    cluster_size : int
+        The size of the clusters to divide the curve into. The points left over at the end
+        of the curve form one last, smaller cluster.
+    accumulators : numpy.ndarray
+        The intensity to distribute in each cluster.
+    halftone : numpy.ndarray
+        The flattened output image, written in place.
+    """
+
+    n_on = accumulators // 255
+
+    k = np.arange(len(curve))
+    halftone[curve] = np.where(k % cluster_size < n_on[k // cluster_size], 255, 0)
+
+
+@njit(cache=True)
+def _distribute(cluster, intensity_accumulator, halftone):
+    """
+    Distribute the intensity of a cluster over its pixels, in the order they are given.
+
+    Parameters:
+    -----------
+    cluster : numpy.ndarray
+        The index into the flattened image of each point of the cluster.
+    intensity_accumulator : int
+        The intensity to distribute in the cluster.
+    halftone : numpy.ndarray
+        The flattened output image, written in place.
+    """
+
+    for k in range(len(cluster)):
+        if intensity_accumulator >= 255:
+            halftone[cluster[k]] = 255
+            intensity_accumulator -= 255
+        else:
+            halftone[cluster[k]] = 0
+
+
+@njit(cache=True, parallel=True, fastmath=False)
+def _halftone_standard(image, curve, starts, accumulators, halftone):
+    """
+    Halftone the clusters of a space filling curve in parallel, following the curve within
+    each cluster.
+
+    Parameters:
+    -----------
+    image : numpy.ndarray
+        The flattened input grayscale image to be halftoned.
+    curve : numpy.ndarray
+        The index into the flattened image of each point on the space filling curve.
+    starts : numpy.ndarray
+        The index of the first point of each cluster. The last cluster runs to the end of
+        the curve.
+    accumulators : numpy.ndarray
+        The intensity to distribute in each cluster.
+    halftone : numpy.ndarray
+        The flattened output image, written in place.
+    """
+
+    n_clusters = len(starts)
+
+    for c in prange(n_clusters):
+        end = starts[c + 1] if c + 1 < n_clusters else len(curve)
+        _distribute(curve[starts[c]:end], accumulators[c], halftone)
+
+
+@njit(cache=True, parallel=True, fastmath=False)
+def _halftone_ordered(image, curve, starts, accumulators, halftone):
+    """
+    Halftone the clusters of a space filling curve in parallel, from the darkest to the
+    brightest pixel of each cluster. The clusters are sorted in place.
+
+    Parameters:
+    -----------
+    image : numpy.ndarray
+        The flattened input grayscale image to be halftoned.
+    curve : numpy.ndarray
+        The index into the flattened image of each point on the space filling curve.
+    starts : numpy.ndarray
+        The index of the first point of each cluster. The last cluster runs to the end of
+        the curve.
+    accumulators : numpy.ndarray
+        The intensity to distribute in each cluster.
+    halftone : numpy.ndarray
+        The flattened output image, written in place.
+    """
+
+    n_clusters = len(starts)
+
+    for c in prange(n_clusters):
+        end = starts[c + 1] if c + 1 < n_clusters else len(curve)
+        cluster = curve[starts[c]:end]
+
+        # clusters are small, and insertion sort is stable like the NumPy path
+        for k in range(1, len(cluster)):
+            point = cluster[k]
+            m = k - 1
+            while m >= 0 and image[cluster[m]] > image[point]:
+                cluster[m + 1] = cluster[m]
+                m -= 1
+            cluster[m + 1] = point
+
+        _distribute(cluster, accumulators[c], halftone)
+
+
+@njit(cache=True, parallel=True, fastmath=False)
+def _halftone_random(image, curve, starts, accumulators, halftone):
+    """
+    Halftone the clusters of a space filling curve in parallel, in a random order within
+    each cluster. The clusters are shuffled in place.
+
+    Parameters:
+    -----------
+    image : numpy.ndarray
+        The flattened input grayscale image to be halftoned.
+    curve : numpy.ndarray
+        The index into the flattened image of each point on the space filling curve.
+    starts : numpy.ndarray
+        The index of the first point of each cluster. The last cluster runs to the end of
+        the curve.
+    accumulators : numpy.ndarray
+        The intensity to distribute in each cluster.
+    halftone : numpy.ndarray
+        The flattened output image, written in place.
+    """
+
+    n_clusters = len(starts)
+
+    for c in prange(n_clusters):
+        end = starts[c + 1] if c + 1 < n_clusters else len(curve)
+        cluster = curve[starts[c]:end]
+        np.random.shuffle(cluster)
+        _distribute(cluster, accumulators[c], halftone)
+
+
+if _halftone_aot is not None:
+    _HALFTONE_KERNELS = {
+        'standard': _halftone_aot.halftone_standard,
+        'ordered': _halftone_aot.halftone_ordered,
+        'random': _halftone_aot.halftone_random,
+    }
+elif _HAS_NUMBA:
+    _HALFTONE_KERNELS = {
+        'standard': _halftone_standard,
+        'ordered': _halftone_ordered,
+        'random': _halftone_random,
+    }
+else:
+    _HALFTONE_KERNELS = None
+
+
+def halftoning(image_in, curve_type, cluster_size, distribution, tile=0):
     """
     Apply digital halftoning to an input image using a specified space-filling curve and
     distribution method.
@@ -126,6 +414,9 @@ def halftoning(image_in, curve_type, cluster_size, distribution):
     distribution : str
         The method of distributing pixel intensities within each cluster
         (standard, ordered, or random).
+    tile : int, optional
+        The size of the square tiles to split the image into, each halftoned separately with
+        a curve of its own size. The whole image is halftoned at once if 0.
 
     Returns:
     --------
@@ -133,32 +424,37 @@ def halftoning(image_in, curve_type, cluster_size, distribution):
         The resulting halftoned image.
     """
 
-    halftone = np.zeros_like(image_in)
+    if tile > 0:
+        halftone = np.empty(image_in.shape, dtype=image_in.dtype)
 
-    curve = space_filling_curve(curve_type, order(halftone, curve_type))
-    curve = [(x, y) for x, y in curve if x < halftone.shape[1] and y < halftone.shape[0]]
+        for ty in range(0, image_in.shape[0], tile):
+            for tx in range(0, image_in.shape[1], tile):
+                halftone[ty:ty + tile, tx:tx + tile] = halftoning(
+                    image_in[ty:ty + tile, tx:tx + tile], curve_type, cluster_size, distribution)
 
-    n_clusters = len(curve) // cluster_size
-    clusters = np.array_split(curve, n_clusters)
-    intensity_accumulator = 0
+        return halftone
 
-    for cluster in clusters:
-        if distribution == 'ordered':
-            cluster = sorted(cluster, key=lambda p: image_in[p[1], p[0]])
-        elif distribution == 'random':
-            np.random.shuffle(cluster)
-        elif distribution != 'standard':
-            raise ValueError('invalid distribution type, choose from (standard, ordered, random)')
-
-        for x, y in cluster:
-            intensity_accumulator += image_in[y, x]
-
-        for x, y in cluster:
-            if intensity_accumulator >= 255:
-                halftone[y, x] = 255
-                intensity_accumulator -= 255
-            else:
-                halftone[y, x] = 0
+    halftone = np.zeros(image_in.shape, dtype=image_in.dtype)
+    height, width = halftone.shape
+
+    xs, ys = space_filling_curve(curve_type, order(halftone, curve_type))
+    inside = (xs < width) & (ys < height)
+    curve = ys[inside].astype(np.int64) * width + xs[inside]
+
+    if distribution not in ('standard', 'ordered', 'random'):
+        raise ValueError('invalid distribution type, choose from (standard, ordered, random)')
+
+    image = image_in.ravel()
+    accumulators = _cluster_accumulators(image, curve, cluster_size)
+
+    if _HALFTONE_KERNELS is not None:
+        starts = np.arange(0, len(curve), cluster_size, dtype=np.int64)
+        _HALFTONE_KERNELS[distribution](image, curve, starts, accumulators, halftone.reshape(-1))
+    else:
+        if distribution != 'standard':
+            _reorder_clusters(image, curve, cluster_size, distribution)
+
+        _halftone_prefix_sums(curve, cluster_size, accumulators, halftone.reshape(-1))
 
     return halftone
 
@@ -173,6 +469,7 @@ if __name__ == '__main__':
         'gamma': 1.0,
         'blur': 1.0,
         'weight': 1.0,
+        'tile': 0,
     }
 
     parser.add_argument('-i', '--image_in', metavar='image_in', type=str,
@@ -197,6 +494,9 @@ if __name__ == '__main__':
     parser.add_argument('-w', '--weight', metavar='weight', type=float,
                         default=default['weight'],
                         help='weight value for edge enhancement')
+    parser.add_argument('-T', '--tile', metavar='tile', type=int,
+                        default=default['tile'],
+                        help='size of the tiles to halftone separately (0 to disable tiling)')
     args = parser.parse_args()
 
     image_in = cv2.imread(args.image_in, cv2.IMREAD_GRAYSCALE)
@@ -206,9 +506,13 @@ if __name__ == '__main__':
     gamma = args.gamma
     blur = args.blur
     weight = args.weight
-
-    gamma_corrected_image = gamma_correction(image_in, gamma)
-    edge_enhanced_image = edge_enhancement(gamma_corrected_image, blur, weight)
-    halftone_image = halftoning(edge_enhanced_image, curve_type, cluster_size, distribution)
+    tile = args.tile
+
+    # gamma correction is applied pixel by pixel, so it can overwrite the input image, while
+    # edge enhancement reads neighbouring pixels and needs a buffer of its own
+    gamma_corrected_image = gamma_correction(image_in, gamma, out=image_in)
+    edge_enhanced_image = edge_enhancement(gamma_corrected_image, blur, weight,
+                                           out=np.empty_like(image_in))
+    halftone_image = halftoning(edge_enhanced_image, curve_type, cluster_size, distribution, tile)
 
     cv2.imwrite(args.image_out, halftone_image)
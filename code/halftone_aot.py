@@ -0,0 +1,25 @@
+#! /usr/bin/env python3
+# --------------------------------------------------------------------------------------------------
+# Ahead-of-time compilation of the halftoning kernel
+#
+# Builds the _halftone_aot extension module next to this file, so digital_halftoning.py can run the
+# compiled kernels without paying the Numba JIT compilation time on every run.
+# --------------------------------------------------------------------------------------------------
+# usage: halftone_aot.py
+# --------------------------------------------------------------------------------------------------
+
+import os
+from numba.pycc import CC
+from digital_halftoning import _halftone_standard, _halftone_ordered, _halftone_random
+
+cc = CC('_halftone_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+signature = 'void(u1[:], i8[:], i8[:], i8[:], u1[:])'
+cc.export('halftone_standard', signature)(_halftone_standard.py_func)
+cc.export('halftone_ordered', signature)(_halftone_ordered.py_func)
+cc.export('halftone_random', signature)(_halftone_random.py_func)
+
+
+if __name__ == '__main__':
+    cc.compile()
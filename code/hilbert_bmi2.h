@@ -0,0 +1,68 @@
+/* -------------------------------------------------------------------------------------------------
+ * Hilbert curve index to (x, y) coordinates, without branches or lookup tables
+ *
+ * Reference: Henry S. Warren, Hacker's Delight, 2nd edition, section 16-2 (parallel prefix
+ * computation of the Hilbert curve). The final step splits the interleaved x and y bits apart,
+ * which is a single pext instruction per coordinate when compiled with BMI2 support (-mbmi2).
+ * -----------------------------------------------------------------------------------------------*/
+
+#ifndef HILBERT_BMI2_H
+#define HILBERT_BMI2_H
+
+#include <stdint.h>
+
+#if defined(__BMI2__)
+#include <immintrin.h>
+#endif
+
+#define HILBERT_EVEN_BITS 0x5555555555555555ULL
+#define HILBERT_ODD_BITS 0xAAAAAAAAAAAAAAAAULL
+
+static inline uint32_t hilbert_compress_even_bits(uint64_t v)
+{
+#if defined(__BMI2__)
+    return (uint32_t)_pext_u64(v, HILBERT_EVEN_BITS);
+#else
+    v &= HILBERT_EVEN_BITS;
+    v = (v | (v >> 1)) & 0x3333333333333333ULL;
+    v = (v | (v >> 2)) & 0x0F0F0F0F0F0F0F0FULL;
+    v = (v | (v >> 4)) & 0x00FF00FF00FF00FFULL;
+    v = (v | (v >> 8)) & 0x0000FFFF0000FFFFULL;
+    v = (v | (v >> 16)) & 0x00000000FFFFFFFFULL;
+    return (uint32_t)v;
+#endif
+}
+
+/* order must be at most 31, so that the padded index fits in 64 bits */
+static inline void hilbert_d2xy(uint64_t i, int order, uint32_t *x, uint32_t *y)
+{
+    uint64_t s, sr, cs, swap, comp, t;
+    uint64_t mask = (2 * order < 64) ? ((1ULL << (2 * order)) - 1) : ~0ULL;
+
+    /* drop the index bits above the curve, then pad on the left with 01 digits, which leave
+       the state unchanged */
+    s = (i & mask) | (HILBERT_EVEN_BITS << (2 * order));
+
+    /* complement and swap information of each 2-bit digit, propagated with a prefix xor */
+    sr = (s >> 1) & HILBERT_EVEN_BITS;
+    cs = ((s & HILBERT_EVEN_BITS) + sr) ^ HILBERT_EVEN_BITS;
+
+    cs ^= cs >> 2;
+    cs ^= cs >> 4;
+    cs ^= cs >> 8;
+    cs ^= cs >> 16;
+    cs ^= cs >> 32;
+
+    swap = cs & HILBERT_EVEN_BITS;
+    comp = (cs >> 1) & HILBERT_EVEN_BITS;
+
+    /* x and y bits in the odd and even positions */
+    t = (s & swap) ^ comp;
+    s = s ^ sr ^ t ^ (t << 1);
+    s &= mask;
+
+    *x = hilbert_compress_even_bits(s >> 1);
+    *y = hilbert_compress_even_bits(s);
+}
+
+#endif
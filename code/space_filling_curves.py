@@ -17,30 +17,110 @@
 # --------------------------------------------------------------------------------------------------
 
 import argparse
+import functools
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+try:
+    from _hilbert_c import hilbert_c
+except ImportError:
+    hilbert_c = None
+
+
+# Hilbert curve state machine, indexed by (state << 2) | quadrant. The state is the orientation
+# of the current sub-square (0: identity, 1: transpose, 2: anti-transpose, 3: rotation by 180
+# degrees), HILBERT_OUT_LUT gives the (x << 1) | y bits of the quadrant in that orientation and
+# HILBERT_STATE_LUT gives the orientation of the next level.
+HILBERT_OUT_LUT = np.array([
+    0, 1, 3, 2,
+    0, 2, 3, 1,
+    3, 1, 0, 2,
+    3, 2, 0, 1,
+], dtype=np.uint8)
+
+HILBERT_STATE_LUT = np.array([
+    1, 0, 0, 2,
+    0, 1, 1, 3,
+    3, 2, 2, 0,
+    2, 3, 3, 1,
+], dtype=np.uint8)
+
+# Sierpinski curve state machine, indexed by (state << 2) | quadrant, where each quadrant is two
+# halvings of a triangle with axis-aligned legs. The state is the corner of the triangle's right
+# angle and the corner the curve enters it from (0: (1, 0) from (0, 0), 1: (0, 1) from (1, 1),
+# 2: (0, 0) from (0, 1), 3: (1, 1) from (1, 0)), SIERPINSKI_OUT_LUT gives the (x << 1) | y bits
+# of the quadrant and SIERPINSKI_STATE_LUT gives the state of the next level.
+SIERPINSKI_OUT_LUT = np.array([
+    0, 2, 2, 3,
+    3, 1, 1, 0,
+    1, 0, 0, 2,
+    2, 3, 3, 1,
+], dtype=np.uint8)
+
+SIERPINSKI_STATE_LUT = np.array([
+    0, 2, 3, 0,
+    1, 3, 2, 1,
+    2, 1, 0, 2,
+    3, 0, 1, 3,
+], dtype=np.uint8)
 
 
 def peano(i, order):
     """
     Compute the (x, y) coordinates of the i-th point on a Peano curve of a given order.
 
+    The base 3 digits of i are taken in pairs, from the most significant one, as the digits
+    of x and y. A digit of x is reflected (d -> 2 - d) when the sum of the previous digits of
+    y is odd, and a digit of y is reflected when the sum of the digits of x so far is odd.
+
     Parameters:
     -----------
-    i : int
-        The index of the point on the Peano curve.
+    i : int or numpy.ndarray
+        The index of the point on the Peano curve, or an array of indices.
     order : int
         The order of the Peano curve. The curve will cover a 3^order x 3^order grid.
 
     Returns:
     --------
-    (x, y) : tuple of int
+    (x, y) : tuple of int or numpy.ndarray
         The (x, y) coordinates of the i-th point on the Peano curve.
     """
 
-    # TODO Implement Peano curve
+    x, y = 0 * i, 0 * i
+    x_parity, y_parity = 0, 0
+
+    for j in reversed(range(order)):
+        x_digit = (i // 3**(2 * j + 1)) % 3
+        y_digit = (i // 3**(2 * j)) % 3
+
+        x = 3 * x + x_digit + y_parity * (2 - 2 * x_digit)
+        x_parity = (x_parity + x_digit) % 2
+
+        y = 3 * y + y_digit + x_parity * (2 - 2 * y_digit)
+        y_parity = (y_parity + y_digit) % 2
+
+    return (x, y)
+
+
+def peano_curve(order):
+    """
+    Compute the (x, y) coordinates of all the points on a Peano curve of a given order.
+
+    Parameters:
+    -----------
+    order : int
+        The order of the Peano curve. The curve will cover a 3^order x 3^order grid.
+
+    Returns:
+    --------
+    (xs, ys) : tuple of numpy.ndarray
+        The x and y coordinates of the points on the Peano curve, as int32 arrays.
+    """
 
-    return (0, 0)
+    n = 3**order
+    x, y = peano(np.arange(n * n, dtype=np.int64), order)
+    return x.astype(np.int32), y.astype(np.int32)
 
 
 def hilbert(i, order):
@@ -62,6 +142,9 @@ def hilbert(i, order):
         The (x, y) coordinates of the i-th point on the Hilbert curve.
     """
 
+    if hilbert_c is not None and 1 <= order <= 31:
+        return hilbert_c(i, order)
+
     first_order_coordinates = [
         (0, 0),
         (0, 1),
@@ -90,10 +173,54 @@ def hilbert(i, order):
     return (x, y)
 
 
+def hilbert_curve(order):
+    """
+    Compute the (x, y) coordinates of all the points on a Hilbert curve of a given order.
+
+    This computes the same points as hilbert(i, order), but runs the HILBERT_OUT_LUT and
+    HILBERT_STATE_LUT state machine on every index at once, one level at a time.
+
+    Parameters:
+    -----------
+    order : int
+        The order of the Hilbert curve. The curve will cover a 2^order x 2^order grid.
+
+    Returns:
+    --------
+    (xs, ys) : tuple of numpy.ndarray
+        The x and y coordinates of the points on the Hilbert curve, as int32 arrays.
+    """
+
+    n = 2**order
+    i = np.arange(n * n, dtype=np.uint32)
+
+    x = np.zeros_like(i)
+    y = np.zeros_like(i)
+
+    state = np.zeros(n * n, dtype=np.uint8)
+
+    for j in reversed(range(order)):
+        quadrant = ((i >> np.uint32(2 * j)) & np.uint32(3)).astype(np.uint8)
+        index = (state << 2) | quadrant
+
+        bits = HILBERT_OUT_LUT[index]
+        state = HILBERT_STATE_LUT[index]
+
+        x = (x << 1) | (bits >> 1)
+        y = (y << 1) | (bits & 1)
+
+    return x.astype(np.int32), y.astype(np.int32)
+
+
 def sierpinski(i, order):
     """
     Compute the (x, y) coordinates of the i-th point on a Sierpinski curve of a given order.
 
+    The grid is split along its diagonal into two right isosceles triangles, and each triangle
+    is recursively halved by the altitude from its right angle until the triangles are half a
+    cell. Taking every other one of these triangles along the curve visits each cell exactly
+    once, so the i-th point is the cell of the (2i)-th triangle.
+
     Parameters:
     -----------
     i : int
@@ -107,15 +234,69 @@ def sierpinski(i, order):
         The (x, y) coordinates of the i-th point on the Sierpinski curve.
     """
 
-    # TODO Implement Sierpinski curve
+    i = i << 1
+    x, y = 0, 0
+    state = (i >> (4 * order)) & 1
+
+    for j in reversed(range(2 * order)):
+        quadrant = (i >> (2 * j)) & 3
+        index = (state << 2) | quadrant
+
+        bits = int(SIERPINSKI_OUT_LUT[index])
+        state = int(SIERPINSKI_STATE_LUT[index])
+
+        x = (x << 1) | (bits >> 1)
+        y = (y << 1) | (bits & 1)
+
+    return (x, y)
+
+
+def sierpinski_curve(order):
+    """
+    Compute the (x, y) coordinates of all the points on a Sierpinski curve of a given order.
+
+    This is a vectorized version of sierpinski(i, order) that runs the same state machine on
+    every index at once, one level at a time.
 
-    return (0, 0)
+    Parameters:
+    -----------
+    order : int
+        The order of the Sierpinski curve.  The curve will cover a 4^order x 4^order grid.
+
+    Returns:
+    --------
+    (xs, ys) : tuple of numpy.ndarray
+        The x and y coordinates of the points on the Sierpinski curve, as int32 arrays.
+    """
+
+    n = 4**order
+    i = np.arange(n * n, dtype=np.uint64) << np.uint64(1)
 
+    x = np.zeros(n * n, dtype=np.uint32)
+    y = np.zeros(n * n, dtype=np.uint32)
 
+    state = ((i >> np.uint64(4 * order)) & np.uint64(1)).astype(np.uint8)
+
+    for j in reversed(range(2 * order)):
+        quadrant = ((i >> np.uint64(2 * j)) & np.uint64(3)).astype(np.uint8)
+        index = (state << 2) | quadrant
+
+        bits = SIERPINSKI_OUT_LUT[index]
+        state = SIERPINSKI_STATE_LUT[index]
+
+        x = (x << 1) | (bits >> 1)
+        y = (y << 1) | (bits & 1)
+
+    return x.astype(np.int32), y.astype(np.int32)
+
+
+@functools.lru_cache(maxsize=8)
 def space_filling_curve(curve_type, order):
     """
     Compute the (x, y) coordinates of the points on a space filling curve of a given type and order.
 
+    The curves are cached per (curve_type, order), so the returned arrays are read-only.
+
     Parameters:
     -----------
     curve_type : str
@@ -125,23 +306,23 @@ def space_filling_curve(curve_type, order):
 
     Returns:
     --------
-    space_filling_curve : list of tuple of int
-        The (x, y) coordinates of the points on the space filling curve.
+    (xs, ys) : tuple of numpy.ndarray
+        The x and y coordinates of the points on the space filling curve, as int32 arrays.
     """
 
     if curve_type == 'hilbert':
-        n = 2**order
-        space_filling_curve = [hilbert(i, order) for i in range(n * n)]
+        xs, ys = hilbert_curve(order)
     elif curve_type == 'peano':
-        n = 3**order
-        space_filling_curve = [peano(i, order) for i in range(n * n)]
+        xs, ys = peano_curve(order)
     elif curve_type == 'sierpinski':
-        n = 4**order
-        space_filling_curve = [sierpinski(i, order) for i in range(n * n)]
+        xs, ys = sierpinski_curve(order)
     else:
         raise ValueError('invalid curve type, choose from (hilbert, peano, sierpinski)')
 
-    return space_filling_curve
+    xs.flags.writeable = False
+    ys.flags.writeable = False
+
+    return xs, ys
 
 
 if __name__ == '__main__':
@@ -163,14 +344,14 @@ if __name__ == '__main__':
     curve_type = args.curve_type
     order = args.order
 
-    curve = space_filling_curve(curve_type, order)
-    n = np.sqrt(len(curve)).astype(int)
+    xs, ys = space_filling_curve(curve_type, order)
+    n = np.sqrt(len(xs)).astype(int)
 
-    x = [x + 0.5 for x, y in curve]
-    y = [y + 0.5 for x, y in curve]
+    points = np.column_stack([xs + 0.5, ys + 0.5]).astype(np.float32)
+    segments = np.stack([points[:-1], points[1:]], axis=1)
 
     fig, ax = plt.subplots()
-    ax.plot(x, y)
+    ax.add_collection(LineCollection(segments))
 
     ax.set_xticks(range(n + 1))
     ax.set_yticks(range(n + 1))